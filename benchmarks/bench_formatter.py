@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import docx
+from format_document import GovDocFormatter
+
+# --- 基准配置 ---
+DEFAULT_SIZES = (1000, 5000, 20000)
+DEFAULT_TABLE_ROWS = (200, 2000)
+TABLE_COLUMNS = 6
+STAGES = ('read', 'skeleton', 'body', 'format_paragraph', 'format_table', 'save', 'total')
+SAMPLE_METADATA = {
+    'copy_number': '000001', 'security_level': '秘密★1年', 'issuing_authority_logo': '某某市人民政府文件',
+    'doc_number': '某政发〔2026〕1号', 'signatory': '张三', 'add_red_separator': True,
+    'main_recipient': '各区县人民政府，市政府各部门', 'issuing_authority_signature': '某某市人民政府',
+    'doc_date': '2026年10月17日', 'cc_list': '市委办公室，市人大常委会办公室', 'printing_info': '某某市人民政府办公室 2026年10月17日印发',
+    'add_page_number': True, 'is_stamped': True, 'title_option': 'auto',
+}
+CN_DIGITS = '一二三四五六七八九十'
+
+# --- 合成语料 ---
+def synthetic_lines(count):
+    lines = ['关于开展性能基准测试工作的通知']
+    for i in range(count):
+        if i % 25 == 0: lines.append(f'{CN_DIGITS[(i // 25) % 10]}、总体要求与工作安排')
+        elif i % 8 == 0: lines.append(f'（{CN_DIGITS[(i // 8) % 10]}）明确工作目标')
+        elif i % 5 == 0: lines.append(f'{i % 9 + 1}.落实具体措施，确保按期完成。')
+        else: lines.append('各单位要高度重视，加强组织领导，细化工作措施，确保各项任务落到实处，' * 3)
+    return lines
+
+def write_txt(path, count):
+    with open(path, 'w', encoding='utf-8') as f: f.write('\n'.join(synthetic_lines(count)))
+
+def write_docx(path, count):
+    doc = docx.Document()
+    for line in synthetic_lines(count): doc.add_paragraph(line)
+    doc.save(path)
+
+def write_table_docx(path, rows):
+    doc = docx.Document()
+    doc.add_paragraph('统计数据表')
+    table = doc.add_table(rows=rows, cols=TABLE_COLUMNS)
+    # 直接写 XML，避免 python-docx 逐单元格访问在大表上的二次方开销
+    for i, tr in enumerate(table._tbl.tr_lst):
+        for j, tc in enumerate(tr.tc_lst): tc.p_lst[0].add_r().text = f'{i}-{j}'
+    table.cell(0, 0).merge(table.cell(0, 1))
+    doc.add_paragraph('以上数据仅供参考。')
+    doc.save(path)
+
+def build_corpus(workdir, sizes, table_rows):
+    corpus = []
+    for count in sizes:
+        for ext, writer in (('txt', write_txt), ('docx', write_docx)):
+            path = os.path.join(workdir, f'paragraphs_{count}.{ext}')
+            writer(path, count); corpus.append(path)
+    for rows in table_rows:
+        path = os.path.join(workdir, f'table_{rows}x{TABLE_COLUMNS}.docx')
+        write_table_docx(path, rows); corpus.append(path)
+    return corpus
+
+# --- 计时与内存 ---
+def peak_memory_mb(data, path):
+    # 在独立进程中运行一次，统计峰值内存增量；lxml 的 C 层内存只有 RSS 能反映
+    formatter = GovDocFormatter()
+    if resource is None:
+        tracemalloc.start()
+        formatter.process(data, path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return round(peak / 2 ** 20, 1)
+    scale = 1 if sys.platform == 'darwin' else 1024
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    formatter.process(data, path)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((after - before) * scale / 2 ** 20, 1)
+
+def measure(formatter, data, path, repeat):
+    runs = []
+    for _ in range(repeat):
+        formatter.process(data, path, on_timings=runs.append)
+    result = {stage: statistics.median(run.get(stage, 0.0) for run in runs) for stage in STAGES}
+    result['paragraphs'] = runs[-1]['paragraphs']; result['tables'] = runs[-1]['tables']
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        result['peak_mb'] = pool.submit(peak_memory_mb, data, path).result()
+    return result
+
+def print_results(results):
+    header = ['corpus'] + list(STAGES) + ['peak_mb']
+    print(' '.join(f'{h:>16}' if i else f'{h:<26}' for i, h in enumerate(header)))
+    for name, result in results.items():
+        cells = [f'{result[stage]:>16.4f}' for stage in STAGES] + [f"{result['peak_mb']:>16.1f}"]
+        print(f'{name:<26} ' + ' '.join(cells))
+
+def compare_baseline(results, baseline_path, tolerance):
+    with open(baseline_path, 'r', encoding='utf-8') as f: baseline = json.load(f)
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous: continue
+        for key in ('total', 'peak_mb'):
+            if previous.get(key) and result[key] > previous[key] * (1 + tolerance):
+                regressions.append(f'{name}: {key} {previous[key]} -> {result[key]}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GovDocFormatter 性能基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='正文段落数')
+    parser.add_argument('--table-rows', type=int, nargs='*', default=list(DEFAULT_TABLE_ROWS), help='大表格行数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个语料重复次数（取中位数）')
+    parser.add_argument('--styles', action='store_true', help='使用样式排版模式')
+    parser.add_argument('--stream', action='store_true', help='使用流式写出引擎')
+    parser.add_argument('--workdir', help='语料与输出目录（默认临时目录）')
+    parser.add_argument('--json', help='将结果写入 JSON 文件，可作为之后的 --baseline')
+    parser.add_argument('--baseline', help='与之前的 JSON 结果比较，超出容差时以非零状态退出')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='回归容差（默认 0.2，即 20%%）')
+    args = parser.parse_args(argv)
+
+    data = dict(SAMPLE_METADATA, use_styles=args.styles, streaming=args.stream)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        corpus = build_corpus(workdir, args.sizes, args.table_rows)
+        formatter = GovDocFormatter()
+        results = {os.path.basename(path): measure(formatter, data, path, args.repeat) for path in corpus}
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(results, f, ensure_ascii=False, indent=4)
+    if args.baseline:
+        regressions = compare_baseline(results, args.baseline, args.tolerance)
+        for line in regressions: print(f'[回归] {line}')
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import os
+import py_compile
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- 启动目标（毫秒，取多次冷启动的中位数） ---
+STARTUP_TARGETS_MS = {
+    'import format_document': 50,
+    'format_document.py --help': 150,
+}
+HEAVY_MODULES = ('docx', 'lxml', 'tkinter', 'sv_ttk')
+
+PROBES = {
+    # 引擎模块导入：不得加载 GUI 或 python-docx
+    'import format_document': (
+        "import sys, time; t = time.perf_counter(); import format_document; "
+        "print((time.perf_counter() - t) * 1000); print(','.join(m for m in {heavy!r} if m in sys.modules))"),
+    # 首次创建格式化引擎：python-docx/lxml 的延迟加载成本
+    'GovDocFormatter()': (
+        "import time, format_document; t = time.perf_counter(); format_document.GovDocFormatter(); "
+        "print((time.perf_counter() - t) * 1000); print('')"),
+    # 图形界面模块导入（tkinter + sv_ttk，不创建窗口）
+    'import format_gui': (
+        "import sys, time; t = time.perf_counter(); import format_gui; "
+        "print((time.perf_counter() - t) * 1000); print(','.join(m for m in ('docx', 'lxml') if m in sys.modules))"),
+}
+
+def run_probe(code):
+    env = dict(os.environ, PYTHONPATH=ROOT); env.pop('PYTHONDONTWRITEBYTECODE', None)
+    completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0: return None, completed.stderr.strip().splitlines()[-1]
+    elapsed, loaded = (completed.stdout.splitlines() + [''])[:2]
+    return float(elapsed), loaded
+
+def run_cli_probe():
+    env = dict(os.environ); env.pop('PYTHONDONTWRITEBYTECODE', None)
+    code = ("import subprocess, sys, time; t = time.perf_counter(); "
+            "subprocess.run([sys.executable, 'format_document.py', '--help'], capture_output=True); print((time.perf_counter() - t) * 1000)")
+    completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    return float(completed.stdout.strip())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='冷启动与导入耗时基准')
+    parser.add_argument('--repeat', type=int, default=7, help='每项重复次数（取中位数）')
+    args = parser.parse_args(argv)
+
+    for name in ('format_document.py', 'format_gui.py'):
+        py_compile.compile(os.path.join(ROOT, name))
+
+    failures = []
+    for label, template in PROBES.items():
+        samples, loaded, error = [], '', None
+        for _ in range(args.repeat):
+            elapsed, detail = run_probe(template.format(heavy=HEAVY_MODULES))
+            if elapsed is None: error = detail; break
+            samples.append(elapsed); loaded = detail
+        if error:
+            print(f'{label:<28} 跳过（{error}）'); continue
+        median = statistics.median(samples)
+        target = STARTUP_TARGETS_MS.get(label)
+        status = '' if target is None else ('OK' if median <= target else 'SLOW')
+        print(f'{label:<28} {median:8.1f} ms' + (f'  目标 ≤ {target} ms  {status}' if target else ''))
+        if target and median > target: failures.append(label)
+        if label.startswith('import ') and loaded:
+            print(f'  导入了不应加载的模块: {loaded}'); failures.append(label)
+
+    cli_median = statistics.median(run_cli_probe() for _ in range(args.repeat))
+    target = STARTUP_TARGETS_MS['format_document.py --help']
+    print(f"{'format_document.py --help':<28} {cli_median:8.1f} ms  目标 ≤ {target} ms  {'OK' if cli_median <= target else 'SLOW'}")
+    if cli_median > target: failures.append('format_document.py --help')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
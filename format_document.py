@@ -1,18 +1,245 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, Toplevel, Listbox, END, Menu
+import base64
+import codecs
+import copy
+import glob
+import hashlib
 import json
 import os
 import re
-import docx
-import sv_ttk
-from docx.shared import Mm, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING, WD_TAB_ALIGNMENT
-from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+import sys
+import threading
+import time
+from collections import OrderedDict
 
-# --- 全局配置 ---
-CONFIG_FILE = 'gov_doc_format_config.json'
+# python-docx/lxml 导入较慢，首次创建格式化引擎时才由 load_docx() 加载
+docx = None
+
+# 任何会改变输出内容的修改都需要递增此版本号，使旧的输出缓存失效
+FORMATTER_VERSION = '1.0'
+SKELETON_CACHE_SIZE = 32
+OUTPUT_CACHE_DIR = 'gov_doc_format_cache'
+OUTPUT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+ENCODING_SNIFF_BYTES = 64 * 1024
+BODY_CHUNK_SIZE = 1000
+PROGRESS_INTERVAL = 100
+TABLE_PROPERTIES_XML = (
+    '<w:tblPr xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:tblStyle w:val="TableGrid"/><w:tblW w:type="auto" w:w="0"/><w:jc w:val="center"/>'
+    '<w:tblLayout w:type="autofit"/><w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1"'
+    ' w:lastColumn="0" w:noHBand="0" w:noVBand="1"/></w:tblPr>')
+TABLE_CELL_PROPERTIES = ('w:tcW', 'w:gridSpan', 'w:vMerge')
+DOCUMENT_PART = 'word/document.xml'
+STREAM_BODY_MARKER = 'GW-STREAM-BODY'
+# 只影响生成方式、不影响输出内容的选项，不参与骨架/输出缓存键
+ENGINE_OPTIONS = ('streaming',)
+
+def load_docx():
+    global docx, Mm, Pt, RGBColor, WD_ALIGN_PARAGRAPH, WD_LINE_SPACING, WD_TAB_ALIGNMENT, WD_STYLE_TYPE
+    global qn, OxmlElement, parse_xml, etree
+    if docx is not None: return
+    from lxml import etree
+    from docx.shared import Mm, Pt, RGBColor
+    from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING, WD_TAB_ALIGNMENT
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml.ns import qn
+    from docx.oxml import OxmlElement, parse_xml
+    import docx
+
+# --- 标题层级识别 (GB/T 9704: 一、 / （一） / 1. / （1）) ---
+CN_NUMERALS = '零〇一二三四五六七八九十百千两'
+HEADING_PATTERN = re.compile(
+    r'(?P<h1>[{0}]+、)|(?P<h2>[（(][{0}]+[）)])|(?P<h4>[（(]\d+[）)])|(?P<h3>\d+[.．](?!\d))'.format(CN_NUMERALS))
+HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4}
+
+def classify_heading(text):
+    match = HEADING_PATTERN.match(text)
+    return HEADING_LEVELS[match.lastgroup] if match else 0
+
+def classify_headings(lines):
+    match, levels = HEADING_PATTERN.match, HEADING_LEVELS
+    return [levels[m.lastgroup] if (m := match(line)) else 0 for line in lines]
+
+# --- 源文件读取 ---
+def detect_encoding(path):
+    with open(path, 'rb') as f: prefix = f.read(ENCODING_SNIFF_BYTES)
+    if prefix.startswith(codecs.BOM_UTF8): return 'utf-8-sig'
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)): return 'utf-16'
+    try:
+        # 前缀可能在多字节字符中间截断，使用增量解码器避免误判
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+def iter_text_paragraphs(path, encoding=None):
+    encoding = encoding or detect_encoding(path)
+    if encoding == 'utf-16':
+        with open(path, 'r', encoding=encoding) as f:
+            for line in f: yield line.strip()
+        return
+    # 编码只根据文件开头判断：后文遇到不是 UTF-8 的行时，从该行起改用 GB18030（兼容 ASCII，已输出的行不受影响）
+    with open(path, 'rb') as f:
+        if encoding == 'utf-8-sig': f.read(len(codecs.BOM_UTF8)); encoding = 'utf-8'
+        for raw in f:
+            for line in raw.splitlines():
+                if encoding == 'utf-8':
+                    try: text = line.decode('utf-8')
+                    except UnicodeDecodeError: encoding = 'gb18030'
+                if encoding != 'utf-8': text = line.decode(encoding)
+                yield text.strip()
+
+class SourceDocument:
+    def __init__(self, input_path):
+        self.path = input_path
+        self.is_docx = input_path.lower().endswith('.docx')
+        if self.is_docx:
+            load_docx()
+            self.document = docx.Document(input_path)
+            self.encoding = None
+            self._elements = list(self.document.element.body)
+        else:
+            self.document = None
+            self.encoding = detect_encoding(input_path)
+
+    @property
+    def elements(self):
+        # .txt 按行惰性读取，内存占用与文件大小无关
+        if self.is_docx: return self._elements
+        return iter_text_paragraphs(self.path, self.encoding)
+
+    @property
+    def total(self):
+        return len(self._elements) if self.is_docx else None
+
+    @property
+    def title(self):
+        if self.is_docx:
+            paragraphs = self.document.paragraphs
+            return paragraphs[0].text.strip() if paragraphs else ""
+        lines = self.elements
+        try: return next(lines, "")
+        finally: lines.close()
+
+def default_output_path(input_path):
+    return os.path.splitext(input_path)[0] + "_formatted.docx"
+
+class DocumentSkeleton:
+    # 预先构建的版头/版记骨架；每次组装后复位，重复任务无需重新构建 python-docx 对象
+    def __init__(self, doc, doc_styles, title_index, tail_index):
+        self.doc = doc; self.doc_styles = doc_styles
+        body = doc.element.body
+        children = list(body)
+        self.head = children[:title_index]; self.front = children[title_index + 1:tail_index]
+        self.tail = children[tail_index:-1]; self.sect_pr = children[-1]
+        self.reset()
+
+    def reset(self):
+        # clear() 直接释放正文节点；逐个 remove 会为每个节点创建代理并整体迁移子树，大表格时极慢
+        body = self.doc.element.body
+        body.clear()
+        self.title_placeholder = OxmlElement('w:p')
+        for element in self.head + [self.title_placeholder] + self.front + [self.sect_pr]: body.append(element)
+
+    def attach_tail(self):
+        for element in self.tail: self.sect_pr.addprevious(element)
+
+class FormatCancelled(Exception):
+    pass
+
+class InvalidSourceError(Exception):
+    pass
+
+class BodyProgress:
+    # 正文进度：按已输出的段落数和表格数回调，并在每个块之间检查取消请求
+    def __init__(self, callback=None, cancel_event=None, total=None, timer=None):
+        self.callback = callback; self.cancel_event = cancel_event; self.total = total
+        self.timer = timer
+        self.paragraphs = 0; self.tables = 0
+
+    def advance(self, is_table):
+        if self.cancel_event is not None and self.cancel_event.is_set(): raise FormatCancelled()
+        if is_table: self.tables += 1
+        else: self.paragraphs += 1
+        if self.callback and (is_table or self.paragraphs % PROGRESS_INTERVAL == 0):
+            self.callback(self.paragraphs, self.tables, self.total)
+
+    def finish(self):
+        if self.callback: self.callback(self.paragraphs, self.tables, self.total)
+
+class OutputCache:
+    # 按 (源文件内容, 规范化元数据, 引擎版本) 的哈希缓存生成结果；目录总大小超限时按最近使用时间淘汰
+    def __init__(self, directory=OUTPUT_CACHE_DIR, max_bytes=OUTPUT_CACHE_MAX_BYTES):
+        self.directory = directory; self.max_bytes = max_bytes
+
+    def key(self, input_path, data):
+        metadata = {k: v for k, v in data.items() if v and k not in ENGINE_OPTIONS}
+        if metadata.get('title_option', 'auto') != 'manual': metadata.pop('main_title_manual', None)
+        metadata['title_option'] = metadata.get('title_option', 'auto')
+        digest = hashlib.sha256()
+        digest.update(FORMATTER_VERSION.encode('utf-8') + b'\0')
+        digest.update(json.dumps(metadata, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8') + b'\0')
+        with open(input_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''): digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.docx')
+
+    # 缓存只是加速手段：读写缓存目录出错时按未命中处理，不影响格式化本身
+    def fetch(self, key, output_path):
+        import shutil
+        cached = self.path(key)
+        try:
+            shutil.copyfile(cached, output_path)
+        except OSError:
+            return False
+        try: os.utime(cached)
+        except OSError: pass
+        return True
+
+    def store(self, key, output_path):
+        import shutil
+        temp_path = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            shutil.copyfile(output_path, temp_path)
+            os.replace(temp_path, self.path(key))
+            self.evict()
+        except OSError as e:
+            print(f"[警告] 无法写入输出缓存 {self.directory}: {e}", file=sys.stderr)
+            try: os.remove(temp_path)
+            except OSError: pass
+        return output_path
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.docx'): continue
+                try: stat = entry.stat()
+                except FileNotFoundError: continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            try: os.remove(path)
+            except FileNotFoundError: pass
+            total -= size
+
+class StageTimer:
+    def __init__(self):
+        self.timings = {}; self._last = self._start = time.perf_counter()
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.add(stage, now - self._last)
+        self._last = now
+    def add(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+    def finish(self, **counts):
+        self.timings['total'] = time.perf_counter() - self._start
+        timings = {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+        timings.update(counts)
+        return timings
 
 # --- 格式化引擎 (稳定版) ---
 class GovDocFormatter:
@@ -21,9 +248,13 @@ class GovDocFormatter:
     FONT_HT = '黑体'
     FONT_KT = '楷体_GB2312'
     FONT_SONG = '宋体'
-    SIZE_2 = Pt(22)
-    SIZE_3 = Pt(16)
-    SIZE_4 = Pt(12)
+    STYLE_TITLE = 'GW Title'
+    STYLE_BODY = 'GW Body'
+    STYLE_HEADING_1 = 'GW Heading 1'
+    STYLE_HEADING_2 = 'GW Heading 2'
+    STYLE_HEADING_3 = 'GW Heading 3'
+    STYLE_RECORD = 'GW Record'
+    STYLE_TABLE = 'GW Table Text'
 
     def set_font_style(self, run, font_name, font_size, bold=False, color_rgb=None):
         run.font.name = font_name
@@ -34,19 +265,19 @@ class GovDocFormatter:
         r = run._element
         r.rPr.rFonts.set(qn('w:eastAsia'), font_name)
 
-    def set_paragraph_format(self, p, alignment=None, line_spacing=None, space_before=Pt(0), space_after=Pt(0), first_line_indent=None, right_indent=None):
+    def set_paragraph_format(self, p, alignment=None, line_spacing=None, space_before=None, space_after=None, first_line_indent=None, right_indent=None):
         if alignment is not None: p.alignment = alignment
         if line_spacing is not None:
             p.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
             p.paragraph_format.line_spacing = line_spacing
-        p.paragraph_format.space_before = space_before
-        p.paragraph_format.space_after = space_after
+        p.paragraph_format.space_before = Pt(0) if space_before is None else space_before
+        p.paragraph_format.space_after = Pt(0) if space_after is None else space_after
         if first_line_indent is not None: p.paragraph_format.first_line_indent = first_line_indent
         if right_indent is not None: p.paragraph_format.right_indent = right_indent
 
-    def add_separator(self, doc, thickness='single', size=4, color='FF0000', space_before=Mm(4)):
+    def add_separator(self, doc, thickness='single', size=4, color='FF0000', space_before=None):
         p = doc.add_paragraph()
-        self.set_paragraph_format(p, space_before=space_before, space_after=Pt(0))
+        self.set_paragraph_format(p, space_before=Mm(4) if space_before is None else space_before, space_after=Pt(0))
         pPr = p._element.get_or_add_pPr()
         p_bdr = OxmlElement('w:pBdr')
         bottom_bdr = OxmlElement('w:bottom')
@@ -73,8 +304,49 @@ class GovDocFormatter:
         run._r.append(fld_char_begin); run._r.append(instr_text); run._r.append(fld_char_end)
         run = p.add_run(' —'); self.set_font_style(run, self.FONT_SONG, self.SIZE_4)
 
-    def process(self, data, input_path):
+    def __init__(self, output_cache=None):
+        load_docx()
+        self.output_cache = output_cache
+        self.SIZE_2 = Pt(22); self.SIZE_3 = Pt(16); self.SIZE_4 = Pt(12)
+        self.timings = {}
+        self.doc_styles = None
+        self._skeletons = OrderedDict()
+
+    def register_styles(self, doc):
+        # 样式模式：一次性登记 GB/T 9704 段落样式，正文段落只引用样式而不逐段写入格式
+        specs = [
+            (self.STYLE_TITLE, self.FONT_XBS, self.SIZE_2, False, WD_ALIGN_PARAGRAPH.CENTER, None, None, self.SIZE_3 * 2),
+            (self.STYLE_BODY, self.FONT_FS, self.SIZE_3, False, WD_ALIGN_PARAGRAPH.JUSTIFY, Pt(28), Pt(self.SIZE_3.pt * 2), Pt(0)),
+            (self.STYLE_HEADING_1, self.FONT_HT, self.SIZE_3, False, None, Pt(28), None, Pt(0)),
+            (self.STYLE_HEADING_2, self.FONT_KT, self.SIZE_3, True, None, Pt(28), None, Pt(0)),
+            (self.STYLE_HEADING_3, self.FONT_FS, self.SIZE_3, True, None, Pt(28), None, Pt(0)),
+            (self.STYLE_RECORD, self.FONT_FS, self.SIZE_4, False, None, Pt(28), None, Pt(0)),
+            (self.STYLE_TABLE, self.FONT_FS, self.SIZE_3, False, WD_ALIGN_PARAGRAPH.CENTER, Pt(28), None, Pt(0)),
+        ]
+        styles = {}
+        for name, font_name, font_size, bold, alignment, line_spacing, first_line_indent, space_before in specs:
+            style = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+            style.base_style = doc.styles['Normal']
+            style.quick_style = True
+            style.font.name = font_name; style.font.size = font_size; style.font.bold = bold
+            style.element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+            fmt = style.paragraph_format
+            if alignment is not None: fmt.alignment = alignment
+            if line_spacing is not None:
+                fmt.line_spacing_rule = WD_LINE_SPACING.EXACTLY
+                fmt.line_spacing = line_spacing
+            fmt.space_before = space_before; fmt.space_after = Pt(0)
+            if first_line_indent is not None: fmt.first_line_indent = first_line_indent
+            styles[name] = style.style_id
+        return styles
+
+    def skeleton_key(self, data):
+        # 标题取决于源文件，不参与骨架缓存
+        return json.dumps({k: v for k, v in data.items() if v and k not in ('title_option', 'main_title_manual') + ENGINE_OPTIONS}, ensure_ascii=False, sort_keys=True, default=str)
+
+    def build_skeleton(self, data):
         doc = docx.Document()
+        doc_styles = self.register_styles(doc) if data.get('use_styles') else None
         section = doc.sections[0]
         section.top_margin = Mm(37); section.bottom_margin = Mm(35); section.left_margin = Mm(28); section.right_margin = Mm(26)
 
@@ -110,30 +382,16 @@ class GovDocFormatter:
 
         if data.get('add_red_separator'): self.add_separator(doc)
 
-        # --- 主体 ---
-        title_source = data.get('title_option', 'auto')
-        main_title = ""
-        if title_source == 'manual':
-            main_title = data.get('main_title_manual', '')
-        elif input_path:
-            try:
-                if input_path.lower().endswith('.txt'):
-                    with open(input_path, 'r', encoding='utf-8') as f: main_title = f.readline().strip()
-                elif input_path.lower().endswith('.docx'):
-                    source_doc = docx.Document(input_path)
-                    if source_doc.paragraphs: main_title = source_doc.paragraphs[0].text.strip()
-            except Exception: pass
-        
-        if main_title:
-            p = doc.add_paragraph(); self.set_paragraph_format(p, alignment=WD_ALIGN_PARAGRAPH.CENTER, space_before=self.SIZE_3 * 2)
-            run = p.add_run(main_title); self.set_font_style(run, self.FONT_XBS, self.SIZE_2)
-
+        # --- 主体（标题占位，正文在组装时插入） ---
+        body = doc.element.body
+        title_index = len(body) - 1
+        doc.add_paragraph()
         if data.get('main_recipient'):
             p = doc.add_paragraph(); self.set_paragraph_format(p, alignment=WD_ALIGN_PARAGRAPH.LEFT, space_before=self.SIZE_3)
             run = p.add_run(data['main_recipient'] + '：'); self.set_font_style(run, self.FONT_FS, self.SIZE_3)
 
         doc.add_paragraph()
-        self.process_body(doc, input_path, main_title if title_source == 'auto' else None)
+        tail_index = len(body) - 1
 
         # --- 文末要素 ---
         if data.get('attachment_note'):
@@ -155,236 +413,647 @@ class GovDocFormatter:
         # --- 版记 ---
         if data.get('cc_list') or data.get('printing_info'):
             self.add_separator(doc, thickness='double', size=6, color='000000', space_before=self.SIZE_3)
-            if data.get('cc_list'):
+            if data.get('cc_list') and doc_styles:
+                doc.add_paragraph("抄送：" + data.get('cc_list',''))._p.style = doc_styles[self.STYLE_RECORD]
+            elif data.get('cc_list'):
                 p = doc.add_paragraph(); self.set_paragraph_format(p, line_spacing=Pt(28))
                 run = p.add_run("抄送：" + data.get('cc_list','')); self.set_font_style(run, self.FONT_FS, self.SIZE_4)
-            if data.get('printing_info'):
+            if data.get('printing_info') and doc_styles:
+                p = doc.add_paragraph(data['printing_info']); p._p.style = doc_styles[self.STYLE_RECORD]; p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            elif data.get('printing_info'):
                 p = doc.add_paragraph(); self.set_paragraph_format(p, alignment=WD_ALIGN_PARAGRAPH.CENTER, line_spacing=Pt(28))
                 run = p.add_run(data['printing_info']); self.set_font_style(run, self.FONT_FS, self.SIZE_4)
             self.add_separator(doc, thickness='single', size=6, color='000000', space_before=Pt(0))
 
-        output_path = os.path.splitext(input_path)[0] + "_formatted.docx"
-        doc.save(output_path)
+        return DocumentSkeleton(doc, doc_styles, title_index, tail_index)
+
+    def open_skeleton(self, data):
+        key = self.skeleton_key(data)
+        skeleton = self._skeletons.get(key)
+        if skeleton is None:
+            skeleton = self._skeletons[key] = self.build_skeleton(data)
+            if len(self._skeletons) > SKELETON_CACHE_SIZE: self._skeletons.popitem(last=False)
+        else:
+            self._skeletons.move_to_end(key)
+        return skeleton
+
+    def process(self, data, input_path, progress=None, cancel_event=None, on_timings=None, output_path=None):
+        # on_timings: 可选的性能回调，启用后额外统计 _format_paragraph/_format_table 的累计耗时
+        timer = StageTimer()
+        output_path = output_path or default_output_path(input_path)
+        cache_key = self.output_cache.key(input_path, data) if self.output_cache else None
+        if cache_key and self.output_cache.fetch(cache_key, output_path):
+            timer.lap('cache')
+            self.timings = timer.finish(cache_hit=True)
+            if on_timings: on_timings(self.timings)
+            return output_path
+        source = SourceDocument(input_path) if input_path else None
+        timer.lap('read')
+        skeleton = self.open_skeleton(data)
+        self.doc_styles = skeleton.doc_styles
+        timer.lap('skeleton')
+        try:
+            tracker = BodyProgress(progress, cancel_event, source.total if source else None, timer if on_timings else None)
+            assemble = self._assemble_streaming if data.get('streaming') else self._assemble
+            assemble(skeleton, data, source, output_path, timer, tracker)
+        finally:
+            skeleton.reset()
+        if cache_key:
+            self.output_cache.store(cache_key, output_path)
+            timer.lap('cache')
+        self.timings = timer.finish(paragraphs=tracker.paragraphs, tables=tracker.tables, **({'cache_hit': False} if cache_key else {}))
+        if on_timings: on_timings(self.timings)
         return output_path
 
-    def process_body(self, doc, input_path, auto_detected_title):
-        is_docx = input_path.lower().endswith('.docx')
-        if is_docx:
-            source_doc = docx.Document(input_path)
-            elements = source_doc.element.body
+    def _place_title(self, skeleton, data, source_title):
+        doc = skeleton.doc
+        # --- 主体 ---
+        title_source = data.get('title_option', 'auto')
+        main_title = ""
+        if title_source == 'manual':
+            main_title = data.get('main_title_manual', '')
+        elif source_title:
+            main_title = source_title
+
+        p = docx.text.paragraph.Paragraph(skeleton.title_placeholder, doc._body)
+        if main_title and self.doc_styles:
+            p._p.style = self.doc_styles[self.STYLE_TITLE]; p.add_run(main_title)
+        elif main_title:
+            self.set_paragraph_format(p, alignment=WD_ALIGN_PARAGRAPH.CENTER, space_before=self.SIZE_3 * 2)
+            run = p.add_run(main_title); self.set_font_style(run, self.FONT_XBS, self.SIZE_2)
         else:
-            with open(input_path, 'r', encoding='utf-8') as f:
-                elements = f.readlines()
+            doc.element.body.remove(skeleton.title_placeholder)
+        return main_title if title_source == 'auto' else None
+
+    def _assemble(self, skeleton, data, source, output_path, timer, tracker):
+        doc = skeleton.doc
+        auto_title = self._place_title(skeleton, data, source.title if source else "")
+        timer.lap('head')
+        self.process_body(doc, source, auto_title, tracker)
+        timer.lap('body')
+
+        skeleton.attach_tail()
+        timer.lap('tail')
+        doc.save(output_path)
+        timer.lap('save')
+        return output_path
 
-        for i, element in enumerate(elements):
+    def _assemble_streaming(self, skeleton, data, source, output_path, timer, tracker):
+        # 流式引擎：正文每 BODY_CHUNK_SIZE 个块序列化一次并直接写入压缩包，内存中只保留当前批次
+        doc = skeleton.doc; body = doc.element.body
+        auto_title = self._place_title(skeleton, data, source.title if source else "")
+        timer.lap('head')
+        def write_body(stream):
+            self.process_body(doc, source, auto_title, tracker, on_chunk=lambda: self._flush_body(body, skeleton.sect_pr, stream))
+            timer.lap('body')
+        self._write_package(skeleton, output_path, write_body)
+        timer.lap('save')
+        return output_path
+
+    def _write_package(self, skeleton, output_path, write_body):
+        # 版头/版记与其余部件（样式、页脚页码等）取自骨架模板，word/document.xml 的正文部分由 write_body 写入
+        import io, zipfile
+        doc = skeleton.doc; body = doc.element.body
+        marker = etree.Comment(STREAM_BODY_MARKER); skeleton.sect_pr.addprevious(marker)
+        skeleton.attach_tail()
+        template = io.BytesIO(); doc.save(template)
+        head_xml, tail_xml = etree.tostring(doc.element, encoding='UTF-8', standalone=True).split(etree.tostring(marker))
+        body.clear(); body.append(skeleton.sect_pr)
+        # 先写入同目录下的临时文件，成功后再替换，取消或出错时保留原有的输出文件
+        temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with zipfile.ZipFile(template) as template_zip, zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as output_zip:
+                for info in template_zip.infolist():
+                    if info.filename != DOCUMENT_PART:
+                        output_zip.writestr(info, template_zip.read(info)); continue
+                    part_info = zipfile.ZipInfo(info.filename, info.date_time); part_info.compress_type = zipfile.ZIP_DEFLATED
+                    with output_zip.open(part_info, 'w') as stream:
+                        stream.write(head_xml); write_body(stream); stream.write(tail_xml)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path): os.remove(temp_path)
+            raise
+
+    def _flush_body(self, body, sect_pr, stream):
+        # 命名空间只在 w:body 起始标签上声明，截去首尾标签和 sectPr 即得到与整篇序列化一致的段落 XML
+        if len(body) == 1: return
+        xml = etree.tostring(body, encoding='UTF-8', xml_declaration=False)
+        stream.write(xml[xml.index(b'>') + 1:xml.rindex(b'<w:sectPr')])
+        body.clear(); body.append(sect_pr)
+
+    def build_merge_body(self, data, source):
+        # 套打：正文只排版一次，序列化为 document.xml 片段供各份公文复用
+        import io
+        skeleton = self.open_skeleton(data)
+        self.doc_styles = skeleton.doc_styles
+        body = skeleton.doc.element.body; buffer = io.BytesIO()
+        try:
+            body.clear(); body.append(skeleton.sect_pr)
+            auto_title = source.title if data.get('title_option', 'auto') == 'auto' else None
+            self.process_body(skeleton.doc, source, auto_title, on_chunk=lambda: self._flush_body(body, skeleton.sect_pr, buffer))
+        finally:
+            skeleton.reset()
+        return buffer.getvalue()
+
+    def stamp(self, data, source_title, body_xml, output_path):
+        skeleton = self.open_skeleton(data)
+        self.doc_styles = skeleton.doc_styles
+        try:
+            self._place_title(skeleton, data, source_title)
+            self._write_package(skeleton, output_path, lambda stream: stream.write(body_xml))
+        finally:
+            skeleton.reset()
+        return output_path
+
+    def process_body(self, doc, source, auto_detected_title, tracker=None, on_chunk=None):
+        if not isinstance(source, SourceDocument): source = SourceDocument(source)
+        if tracker is None: tracker = BodyProgress()
+        is_docx = source.is_docx
+
+        blocks = []
+        for i, element in enumerate(source.elements):
             text_to_process, is_table = "", False
             if is_docx:
                 if element.tag.endswith('p'): text_to_process = docx.text.paragraph.Paragraph(element, doc).text.strip()
                 elif element.tag.endswith('tbl'): is_table = True
-            else: text_to_process = element.strip()
+            else: text_to_process = element
 
             if is_table:
-                self._format_table(doc, docx.table.Table(element, doc)); continue
-            if not text_to_process: continue
-            if i == 0 and text_to_process == auto_detected_title: continue
-            self._format_paragraph(doc, text_to_process)
+                blocks.append(element)
+            elif text_to_process and not (i == 0 and text_to_process == auto_detected_title):
+                blocks.append(text_to_process)
+            if len(blocks) >= BODY_CHUNK_SIZE:
+                self._format_blocks(doc, blocks, tracker); blocks = []
+                if on_chunk: on_chunk()
+        self._format_blocks(doc, blocks, tracker)
+        if on_chunk: on_chunk()
+        tracker.finish()
+
+    def _format_blocks(self, doc, blocks, tracker):
+        levels = classify_headings(block if isinstance(block, str) else '' for block in blocks)
+        timer = tracker.timer
+        for block, level in zip(blocks, levels):
+            is_table = not isinstance(block, str)
+            tracker.advance(is_table)
+            start = time.perf_counter() if timer else 0.0
+            if is_table: self._format_table(doc, block)
+            else: self._format_paragraph(doc, block, level)
+            if timer: timer.add('format_table' if is_table else 'format_paragraph', time.perf_counter() - start)
 
-    def _format_paragraph(self, doc, text):
+    def _format_paragraph(self, doc, text, level=None):
+        if level is None: level = classify_heading(text)
+        if self.doc_styles:
+            style_name = {1: self.STYLE_HEADING_1, 2: self.STYLE_HEADING_2, 3: self.STYLE_HEADING_3}.get(level, self.STYLE_BODY)
+            doc.add_paragraph(text)._p.style = self.doc_styles[style_name]; return
         p = doc.add_paragraph()
         self.set_paragraph_format(p, line_spacing=Pt(28))
-        if re.match(r'^一、|^二、|^三、', text): run = p.add_run(text); self.set_font_style(run, self.FONT_HT, self.SIZE_3)
-        elif re.match(r'^\uff08[一二三四五]+\uff09', text): run = p.add_run(text); self.set_font_style(run, self.FONT_KT, self.SIZE_3, bold=True)
-        elif re.match(r'^\d+\.', text): run = p.add_run(text); self.set_font_style(run, self.FONT_FS, self.SIZE_3, bold=True)
+        if level == 1: run = p.add_run(text); self.set_font_style(run, self.FONT_HT, self.SIZE_3)
+        elif level == 2: run = p.add_run(text); self.set_font_style(run, self.FONT_KT, self.SIZE_3, bold=True)
+        elif level == 3: run = p.add_run(text); self.set_font_style(run, self.FONT_FS, self.SIZE_3, bold=True)
         else:
             self.set_paragraph_format(p, alignment=WD_ALIGN_PARAGRAPH.JUSTIFY, line_spacing=Pt(28), first_line_indent=Pt(self.SIZE_3.pt * 2))
             run = p.add_run(text); self.set_font_style(run, self.FONT_FS, self.SIZE_3)
 
     def _format_table(self, doc, source_table):
-        new_table = doc.add_table(rows=len(source_table.rows), cols=len(source_table.columns))
-        new_table.style = 'Table Grid'
-        new_table.alignment = WD_TABLE_ALIGNMENT.CENTER
-        new_table.autofit = True
-        for i, row in enumerate(source_table.rows):
-            for j, cell in enumerate(row.cells):
-                new_cell = new_table.cell(i, j)
-                new_cell.text = ""
-                for para in cell.paragraphs:
-                    new_para = new_cell.add_paragraph(para.text)
-                    self.set_paragraph_format(new_para, alignment=WD_ALIGN_PARAGRAPH.CENTER, line_spacing=Pt(28))
-                    for run in new_para.runs:
-                        self.set_font_style(run, self.FONT_FS, self.SIZE_3)
-
-# --- GUI and App Logic ---
-class ConfigManager:
-    def __init__(self, filename=CONFIG_FILE):
-        self.filename = filename; self.data = self.load()
-    def load(self):
+        doc.element.body.sectPr.addprevious(self.build_table(getattr(source_table, '_tbl', source_table)))
+
+    def build_table(self, source_tbl):
+        # 直接遍历源 w:tbl 的 XML 一次性生成新表格，保留合并单元格 (gridSpan/vMerge)
+        tbl = OxmlElement('w:tbl')
+        tbl.append(parse_xml(TABLE_PROPERTIES_XML))
+        grid = source_tbl.find(qn('w:tblGrid'))
+        tbl.append(copy.deepcopy(grid) if grid is not None else OxmlElement('w:tblGrid'))
+        template = self._table_paragraph_template()
+        for tr in source_tbl.iterchildren(qn('w:tr')):
+            new_tr = OxmlElement('w:tr'); tbl.append(new_tr)
+            tr_pr = tr.find(qn('w:trPr'))
+            if tr_pr is not None: new_tr.append(copy.deepcopy(tr_pr))
+            for tc in tr.iterchildren(qn('w:tc')):
+                new_tc = OxmlElement('w:tc'); new_tr.append(new_tc)
+                tc_pr = OxmlElement('w:tcPr'); new_tc.append(tc_pr)
+                source_tc_pr = tc.find(qn('w:tcPr'))
+                if source_tc_pr is not None:
+                    for tag in TABLE_CELL_PROPERTIES:
+                        prop = source_tc_pr.find(qn(tag))
+                        if prop is not None: tc_pr.append(copy.deepcopy(prop))
+                for p in tc.iterchildren(qn('w:p')):
+                    new_tc.append(self._table_paragraph(template, docx.text.paragraph.Paragraph(p, None).text))
+                if len(new_tc) == 1: new_tc.append(self._table_paragraph(template, ''))
+        return tbl
+
+    def _table_paragraph_template(self):
+        p = docx.text.paragraph.Paragraph(OxmlElement('w:p'), None)
+        if self.doc_styles:
+            p._p.style = self.doc_styles[self.STYLE_TABLE]; p.add_run()
+        else:
+            self.set_paragraph_format(p, alignment=WD_ALIGN_PARAGRAPH.CENTER, line_spacing=Pt(28))
+            run = p.add_run(); self.set_font_style(run, self.FONT_FS, self.SIZE_3)
+        return p._p
+
+    def _table_paragraph(self, template, text):
+        p = copy.deepcopy(template)
+        r = p.r_lst[0]
+        if text: r.text = text
+        else: p.remove(r)
+        return p
+
+
+# --- 批量处理 (无界面) ---
+SUPPORTED_EXTENSIONS = ('.txt', '.docx')
+BATCH_REPORT_FILE = 'batch_report.json'
+
+_worker_formatter = None
+
+def collect_inputs(patterns):
+    # 返回 (待处理文件, 未匹配到任何文件的路径或通配符)
+    paths, unmatched = [], []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = sorted(os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            candidates = sorted(glob.glob(pattern, recursive=True))
+        if not candidates: unmatched.append(pattern)
+        for path in candidates:
+            name = os.path.basename(path)
+            if not os.path.isfile(path) or name.startswith('~$'): continue
+            if not name.lower().endswith(SUPPORTED_EXTENSIONS): continue
+            if os.path.splitext(name)[0].endswith('_formatted'): continue
+            if path not in paths: paths.append(path)
+    return paths, unmatched
+
+def batch_output_paths(input_paths):
+    # a.txt 与 a.docx 默认都输出到 a_formatted.docx；同名时在文件名中保留扩展名，仍冲突的返回 None
+    groups = {}
+    for path in input_paths: groups.setdefault(os.path.normcase(default_output_path(path)), []).append(path)
+    outputs = {}
+    for paths in groups.values():
+        for path in paths:
+            stem, ext = os.path.splitext(path)
+            outputs[path] = default_output_path(path) if len(paths) == 1 else f"{stem}_{ext.lstrip('.').lower()}_formatted.docx"
+    seen = {}
+    for path in input_paths:
+        key = os.path.normcase(outputs[path])
+        if key in seen: outputs[path] = None
+        else: seen[key] = path
+    return outputs
+
+def _batch_worker(data, input_path, profile=False, output_cache=None, output_path=None):
+    global _worker_formatter
+    if _worker_formatter is None: _worker_formatter = GovDocFormatter(output_cache)
+    start = time.perf_counter()
+    result = {'input': input_path, 'output': None, 'ok': False, 'error': None}
+    try:
+        result['output'] = _worker_formatter.process(data, input_path, on_timings=(lambda timings: result.update(timings=timings)) if profile else None, output_path=output_path)
+        result['ok'] = True
+        result['timings'] = _worker_formatter.timings
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def run_batch(input_paths, data, jobs=None, report_path=BATCH_REPORT_FILE, out=sys.stdout, profile=False, output_cache=None, unmatched=()):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    start = time.perf_counter()
+    results = [{'input': pattern, 'output': None, 'ok': False, 'error': '未匹配到任何文件', 'seconds': 0.0} for pattern in unmatched]
+    outputs = batch_output_paths(input_paths)
+    for path in input_paths:
+        if outputs[path] is None: results.append({'input': path, 'output': None, 'ok': False, 'error': '输出文件名与其他源文件冲突', 'seconds': 0.0})
+    for result in results: print(f"[失败] {result['input']}: {result['error']}", file=out)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_batch_worker, data, path, profile, output_cache, outputs[path]): path for path in input_paths if outputs[path]}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # 工作进程异常退出（如内存不足被终止）时记为失败，保证仍写出汇总报告
+                result = {'input': futures[future], 'output': None, 'ok': False, 'error': f"{type(e).__name__}: {e}", 'seconds': None}
+            results.append(result)
+            if result['ok']:
+                cached = '，缓存命中' if result.get('timings', {}).get('cache_hit') else ''
+                print(f"[成功] {result['input']} -> {result['output']} ({result['seconds']}s{cached})", file=out)
+            else: print(f"[失败] {result['input']}: {result['error']}", file=out)
+    order = list(unmatched) + list(input_paths)
+    results.sort(key=lambda r: order.index(r['input']))
+    summary = {
+        'total': len(results),
+        'succeeded': sum(1 for r in results if r['ok']),
+        'failed': sum(1 for r in results if not r['ok']),
+        'cache_hits': sum(1 for r in results if r.get('timings', {}).get('cache_hit')),
+        'seconds': round(time.perf_counter() - start, 3),
+        'files': results,
+    }
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f: json.dump(summary, f, ensure_ascii=False, indent=4)
+    return summary
+
+def load_metadata(meta_path):
+    if not meta_path: return {}
+    with open(meta_path, 'r', encoding='utf-8') as f: data = json.load(f)
+    if not isinstance(data, dict): raise ValueError(f"元数据文件必须是 JSON 对象: {meta_path}")
+    return data
+
+# --- 套打 (一份正文，多份公文) ---
+MERGE_REPORT_FILE = 'merge_report.json'
+MERGE_FLAG_FIELDS = ('add_red_separator', 'is_stamped', 'add_page_number', 'use_styles')
+MERGE_TRUE_VALUES = ('1', 'true', 'yes', 'y', '是')
+
+_merge_context = None
+
+def load_merge_rows(rows_path):
+    # JSON 为对象数组；CSV 首行为字段名，勾选项的单元格按 1/true/是 识别
+    if rows_path.lower().endswith('.json'):
+        with open(rows_path, 'r', encoding='utf-8') as f: rows = json.load(f)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError(f"套打数据文件必须是 JSON 对象数组: {rows_path}")
+        return rows
+    import csv
+    with open(rows_path, 'r', encoding=detect_encoding(rows_path), newline='') as f:
+        rows = [{k.strip(): (v or '').strip() for k, v in row.items() if k} for row in csv.DictReader(f)]
+    for row in rows:
+        for field in MERGE_FLAG_FIELDS:
+            if row.get(field, '') != '': row[field] = row[field].lower() in MERGE_TRUE_VALUES
+    return rows
+
+def merge_body_key(data):
+    # 只有标题来源和样式模式会影响正文 XML，其余要素都只在骨架中
+    return (data.get('title_option', 'auto') == 'auto', bool(data.get('use_styles')))
+
+def merge_output_path(source_path, out_dir, index, width, data, name_field=None):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    label = re.sub(r'[\\/:*?"<>|\s]+', '_', str(data.get(name_field) or '')).strip('_') if name_field else ''
+    name = f"{stem}_{index:0{width}d}" + (f"_{label}" if label else '') + "_formatted.docx"
+    return os.path.join(out_dir or os.path.dirname(source_path), name)
+
+def _stamp_row(formatter, source_title, bodies, data, output_path):
+    start = time.perf_counter()
+    result = {'output': output_path, 'ok': False, 'error': None}
+    try:
+        formatter.stamp(data, source_title, bodies[merge_body_key(data)], output_path)
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def _merge_worker_init(source_title, bodies):
+    global _worker_formatter, _merge_context
+    _worker_formatter = GovDocFormatter()
+    _merge_context = (source_title, bodies)
+
+def _merge_worker(data, output_path):
+    return _stamp_row(_worker_formatter, *_merge_context, data, output_path)
+
+def run_merge(source_path, rows, data, jobs=1, out_dir=None, name_field=None, report_path=MERGE_REPORT_FILE, out=sys.stdout):
+    # 数据表中的空值沿用公共要素；正文按 merge_body_key 分组，各组只排版一次
+    start = time.perf_counter()
+    if out_dir: os.makedirs(out_dir, exist_ok=True)
+    row_data = [dict(data, **{k: v for k, v in row.items() if v != ''}) for row in rows]
+    width = len(str(len(rows)))
+    outputs = [merge_output_path(source_path, out_dir, i, width, d, name_field) for i, d in enumerate(row_data, 1)]
+
+    formatter = GovDocFormatter()
+    bodies = {}
+    try:
+        source = SourceDocument(source_path)
+        source_title = source.title
+        for d in row_data:
+            key = merge_body_key(d)
+            if key not in bodies: bodies[key] = formatter.build_merge_body(d, source)
+    except Exception as e:
+        raise InvalidSourceError(f"无法读取正文源文件 {source_path}: {type(e).__name__}: {e}") from e
+    body_seconds = round(time.perf_counter() - start, 3)
+
+    if jobs and jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_merge_worker_init, initargs=(source_title, bodies)) as pool:
+            results = list(pool.map(_merge_worker, row_data, outputs))
+    else:
+        results = [_stamp_row(formatter, source_title, bodies, d, path) for d, path in zip(row_data, outputs)]
+    for result in results:
+        if result['ok']: print(f"[成功] {result['output']} ({result['seconds']}s)", file=out)
+        else: print(f"[失败] {result['output']}: {result['error']}", file=out)
+    summary = {
+        'source': source_path,
+        'total': len(results),
+        'succeeded': sum(1 for r in results if r['ok']),
+        'failed': sum(1 for r in results if not r['ok']),
+        'body_seconds': body_seconds,
+        'seconds': round(time.perf_counter() - start, 3),
+        'files': results,
+    }
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f: json.dump(summary, f, ensure_ascii=False, indent=4)
+    return summary
+
+# --- 本地格式化服务 ---
+SERVE_HOST = '127.0.0.1'
+SERVE_PORT = 8765
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+def _serve_worker_init():
+    # 预热：加载 python-docx/lxml 并构建默认骨架，首个请求无需承担冷启动
+    global _worker_formatter
+    _worker_formatter = GovDocFormatter()
+    _worker_formatter.open_skeleton({})
+
+def _serve_ping():
+    return os.getpid()
+
+def _serve_job(data, filename, content):
+    import tempfile, zipfile
+    from docx.opc.exceptions import PackageNotFoundError
+    with tempfile.TemporaryDirectory(prefix='gov_doc_') as workdir:
+        input_path = os.path.join(workdir, filename)
+        with open(input_path, 'wb') as f: f.write(content)
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f: return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError): return {}
-    def save(self):
-        with open(self.filename, 'w', encoding='utf-8') as f: json.dump(self.data, f, ensure_ascii=False, indent=4)
-    def get(self, key, default=None): return self.data.get(key, default or [])
-    def set(self, key, value): self.data[key] = value; self.save()
-
-class ManagementDialog(Toplevel):
-    def __init__(self, parent, title, key, config_manager, on_close_callback):
-        super().__init__(parent)
-        self.title(f"管理 {title}"); self.key = key; self.config_manager = config_manager
-        self.on_close_callback = on_close_callback
-        self.protocol("WM_DELETE_WINDOW", self.close_dialog)
-        self.transient(parent); self.grab_set()
-
-        self.listbox = Listbox(self, width=50, height=10, font=("Segoe UI", 10)); self.listbox.pack(padx=15, pady=15, fill=tk.BOTH, expand=True)
-        for item in self.config_manager.get(self.key): self.listbox.insert(END, item)
-        
-        btn_frame = ttk.Frame(self); btn_frame.pack(fill=tk.X, padx=15, pady=(0, 15))
-        del_btn = ttk.Button(btn_frame, text="删除选中", command=self.delete_item); del_btn.pack(side=tk.RIGHT)
-
-    def delete_item(self):
-        selected_indices = self.listbox.curselection()
-        if not selected_indices: return
-        for i in reversed(selected_indices):
-            self.listbox.delete(i)
-        self.save_changes()
-
-    def save_changes(self):
-        items = list(self.listbox.get(0, END))
-        self.config_manager.set(self.key, items)
-
-    def close_dialog(self):
-        self.on_close_callback()
-        self.destroy()
-
-class ManagedField(ttk.Frame):
-    def __init__(self, parent, key, label, config_manager, controls_dict):
-        super().__init__(parent)
-        self.key = key
-        self.config_manager = config_manager
-        self.controls_dict = controls_dict
-
-        self.pack(fill=tk.X, pady=10, anchor='n')
-        ttk.Label(self, text=label, font=("Segoe UI", 10, "bold")).pack(anchor=tk.W, pady=(0, 5))
-        
-        input_frame = ttk.Frame(self)
-        input_frame.pack(fill=tk.X)
-
-        self.combo = ttk.Combobox(input_frame, font=("Segoe UI", 10))
-        self.combo.pack(side=tk.LEFT, fill=tk.X, expand=True)
-        self.controls_dict[key] = self.combo
-        self.refresh_values()
-
-        add_button = ttk.Button(input_frame, text="+ ", width=3, command=self.add_item)
-        add_button.pack(side=tk.LEFT, padx=(5, 5))
-
-        manage_button = ttk.Button(input_frame, text="⚙️", width=3, command=self.open_management_dialog)
-        manage_button.pack(side=tk.LEFT)
-
-    def add_item(self):
-        new_item = self.combo.get()
-        if not new_item: return
-        current_items = self.config_manager.get(self.key, [])
-        if new_item not in current_items:
-            current_items.append(new_item)
-            self.config_manager.set(self.key, current_items)
-            self.refresh_values()
-            self.combo.set(new_item)
-
-    def open_management_dialog(self):
-        ManagementDialog(self, self.key, self.key, self.config_manager, self.refresh_values)
-
-    def refresh_values(self):
-        self.combo['values'] = self.config_manager.get(self.key, [])
-
-class App(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("公文智能排版工具"); self.geometry("800x850")
-        self.config_manager = ConfigManager()
-        self.formatter = GovDocFormatter()
-        sv_ttk.set_theme("dark")
-        self.create_widgets()
-
-    def create_widgets(self):
-        main_frame = ttk.Frame(self, padding=25); main_frame.pack(fill=tk.BOTH, expand=True)
-        self.controls = {}
-
-        file_card = ttk.LabelFrame(main_frame, text=" 源文件 ", padding=20)
-        file_card.pack(fill=tk.X, pady=(0, 15))
-        self.file_path_var = tk.StringVar(value="尚未选择文件...")
-        select_button = ttk.Button(file_card, text="选择 .txt 或 .docx 文件", command=self.select_file)
-        select_button.pack(side=tk.LEFT, padx=(0, 15))
-        ttk.Label(file_card, textvariable=self.file_path_var).pack(side=tk.LEFT)
-
-        notebook = ttk.Notebook(main_frame); notebook.pack(fill=tk.BOTH, expand=True, pady=10)
-        tab1 = ttk.Frame(notebook, padding=20); tab2 = ttk.Frame(notebook, padding=20); tab3 = ttk.Frame(notebook, padding=20)
-        notebook.add(tab1, text='版头要素'); notebook.add(tab2, text='主体与文末'); notebook.add(tab3, text='版记与选项')
-
-        # --- Tabs Content ---
-        ManagedField(tab1, "copy_number", "份号", self.config_manager, self.controls)
-        ManagedField(tab1, "security_level", "密级和保密期限", self.config_manager, self.controls)
-        ManagedField(tab1, "urgency", "紧急程度", self.config_manager, self.controls)
-        ManagedField(tab1, "issuing_authority_logo", "发文机关标志", self.config_manager, self.controls)
-        ManagedField(tab1, "doc_number", "发文字号", self.config_manager, self.controls)
-        ManagedField(tab1, "signatory", "签发人", self.config_manager, self.controls)
-
-        self.create_title_options(tab2)
-        ManagedField(tab2, "main_recipient", "主送机关", self.config_manager, self.controls)
-        ManagedField(tab2, "issuing_authority_signature", "发文机关署名", self.config_manager, self.controls)
-        ManagedField(tab2, "doc_date", "成文日期", self.config_manager, self.controls)
-        ManagedField(tab2, "attachment_note", "附件说明", self.config_manager, self.controls)
-        ManagedField(tab2, "addendum", "附注", self.config_manager, self.controls)
-
-        ManagedField(tab3, "cc_list", "抄送机关", self.config_manager, self.controls)
-        ManagedField(tab3, "printing_info", "印发机关和印发日期", self.config_manager, self.controls)
-        
-        options_card = ttk.LabelFrame(tab3, text=" 格式选项 ", padding=20)
-        options_card.pack(fill=tk.X, pady=25)
-        self.controls['add_red_separator'] = tk.BooleanVar(value=False)
-        ttk.Checkbutton(options_card, text="生成红色分隔线", variable=self.controls['add_red_separator']).pack(side=tk.LEFT, padx=15)
-        self.controls['is_stamped'] = tk.BooleanVar(value=True)
-        ttk.Checkbutton(options_card, text="是否加盖印章", variable=self.controls['is_stamped']).pack(side=tk.LEFT, padx=15)
-        self.controls['add_page_number'] = tk.BooleanVar(value=True)
-        ttk.Checkbutton(options_card, text="生成页码", variable=self.controls['add_page_number']).pack(side=tk.LEFT, padx=15)
-
-        generate_button = ttk.Button(main_frame, text="生成格式化Word文档", command=self.generate_document, style='Accent.TButton')
-        generate_button.pack(fill=tk.X, ipady=8, pady=15)
-
-    def create_title_options(self, parent):
-        container = ttk.LabelFrame(parent, text=" 公文标题 ", padding=20)
-        container.pack(fill=tk.X, pady=10)
-        
-        self.controls['title_option'] = tk.StringVar(value="auto")
-        
-        auto_rb = ttk.Radiobutton(container, text="自动获取 (源文件第一行)", variable=self.controls['title_option'], value="auto", command=self.toggle_manual_title)
-        auto_rb.pack(anchor=tk.W)
-        
-        manual_frame = ttk.Frame(container)
-        manual_frame.pack(fill=tk.X, anchor=tk.W, pady=(5,0))
-        manual_rb = ttk.Radiobutton(manual_frame, text="手动指定", variable=self.controls['title_option'], value="manual", command=self.toggle_manual_title)
-        manual_rb.pack(side=tk.LEFT, anchor=tk.W)
-        
-        self.controls['main_title_manual'] = ttk.Entry(manual_frame, state=tk.DISABLED, font=("Segoe UI", 10))
-        self.controls['main_title_manual'].pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
-
-    def toggle_manual_title(self):
-        state = tk.NORMAL if self.controls['title_option'].get() == 'manual' else tk.DISABLED
-        self.controls['main_title_manual'].config(state=state)
-
-    def select_file(self):
-        path = filedialog.askopenfilename(filetypes=[("All supported", "*.txt *.docx"), ("Text", "*.txt"), ("Word", "*.docx")])
-        if path: self.file_path_var.set(path)
-
-    def generate_document(self):
-        input_path = self.file_path_var.get()
-        if "尚未选择" in input_path: messagebox.showwarning("警告", "请先选择一个文件！"); return
-        gui_data = {key: (var.get() if hasattr(var, 'get') else var) for key, var in self.controls.items()}
+            output_path = _worker_formatter.process(data, input_path)
+        except (PackageNotFoundError, zipfile.BadZipFile, UnicodeDecodeError) as e:
+            # 上传内容本身无法解析属于客户端错误；原始异常信息含服务器临时路径，不返回给客户端
+            raise InvalidSourceError(f"无法解析上传的文件 {filename}（{type(e).__name__}），请确认是有效的 .docx 或文本文件") from None
+        with open(output_path, 'rb') as f: return f.read(), _worker_formatter.timings
+
+class FormatService:
+    # 进程池常驻预热的格式化引擎；超出 workers + queue_size 的并发请求直接返回 503，由客户端稍后重试
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + (self.workers * 2 if queue_size is None else queue_size)
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.active = 0; self.restarts = 0; self.lock = threading.Lock(); self.pool_lock = threading.Lock()
+        self.pool = self.start_pool()
+
+    def start_pool(self):
+        from concurrent.futures import ProcessPoolExecutor, wait
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_serve_worker_init)
+        wait([pool.submit(_serve_ping) for _ in range(self.workers)])
+        return pool
+
+    def restart_pool(self, broken):
+        # 工作进程异常退出后进程池不可再用；并发请求可能同时发现，只由第一个重建
+        with self.pool_lock:
+            if self.pool is not broken: return
+            broken.shutdown(wait=False)
+            self.pool = self.start_pool(); self.restarts += 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def healthy(self):
+        return not getattr(self.pool, '_broken', False)
+
+    def status(self):
+        return {'healthy': self.healthy(), 'workers': self.workers, 'capacity': self.capacity, 'active': self.active, 'restarts': self.restarts}
+
+    def handle(self, method, path, body):
+        from concurrent.futures.process import BrokenProcessPool
+        if method == 'GET' and path == '/health':
+            return 200 if self.healthy() else 503, 'application/json', json.dumps(self.status()).encode('utf-8'), {}
+        if method != 'POST' or path != '/format':
+            return 404, 'application/json', json.dumps({'error': 'not found'}).encode('utf-8'), {}
         try:
-            output_path = self.formatter.process(gui_data, input_path)
-            messagebox.showinfo("成功", f"文件已成功生成！\n保存路径: {output_path}")
+            request = json.loads(body)
+            filename = os.path.basename(request['filename'])
+            if '\x00' in filename: raise ValueError("文件名不能包含空字符")
+            if not filename.lower().endswith(SUPPORTED_EXTENSIONS): raise ValueError(f"不支持的文件类型: {filename}")
+            content = base64.b64decode(request['content'], validate=True)
+            data = request.get('metadata') or {}
+            if not isinstance(data, dict): raise ValueError("metadata 必须是 JSON 对象")
+            invalid = [key for key, value in data.items() if value is not None and not isinstance(value, (str, bool))]
+            if invalid: raise ValueError(f"metadata 的取值只能是字符串、布尔值或 null: {', '.join(invalid)}")
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, 'application/json', json.dumps({'error': f"请求格式错误: {e}"}, ensure_ascii=False).encode('utf-8'), {}
+        if not self.slots.acquire(blocking=False):
+            return 503, 'application/json', json.dumps({'error': '服务繁忙，请稍后重试'}, ensure_ascii=False).encode('utf-8'), {'Retry-After': '1'}
+        pool = self.pool
+        try:
+            with self.lock: self.active += 1
+            output, timings = pool.submit(_serve_job, data, filename, content).result()
+        except InvalidSourceError as e:
+            return 400, 'application/json', json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'), {}
+        except BrokenProcessPool:
+            try:
+                self.restart_pool(pool); message = '工作进程异常退出，已重启，请重试'
+            except Exception as e:
+                message = f"工作进程异常退出，重启失败: {type(e).__name__}: {e}"
+            return 500, 'application/json', json.dumps({'error': message}, ensure_ascii=False).encode('utf-8'), {}
         except Exception as e:
-            messagebox.showerror("生成失败", f"发生严重错误：\n{e}\n\n请检查文件内容或联系技术支持。")
+            return 500, 'application/json', json.dumps({'error': f"{type(e).__name__}: {e}"}, ensure_ascii=False).encode('utf-8'), {}
+        finally:
+            with self.lock: self.active -= 1
+            self.slots.release()
+        from urllib.parse import quote
+        output_name = os.path.splitext(filename)[0] + '_formatted.docx'
+        headers = {'Content-Disposition': f"attachment; filename*=UTF-8''{quote(output_name)}", 'X-Format-Timings': json.dumps(timings)}
+        return 200, DOCX_MIME, output, headers
+
+def run_server(host=SERVE_HOST, port=SERVE_PORT, workers=None, queue_size=None):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    service = FormatService(workers, queue_size)
+
+    class FormatRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self): self.dispatch(b'')
+        def do_POST(self):
+            try: length = int(self.headers.get('Content-Length') or 0)
+            except ValueError: length = -1
+            # send_error 的原因短语只能是 latin-1，中文说明放在 JSON 正文中
+            if length < 0:
+                self.reply(400, 'application/json', json.dumps({'error': 'Content-Length 无效'}, ensure_ascii=False).encode('utf-8'), {}); return
+            if length > MAX_UPLOAD_BYTES:
+                self.reply(413, 'application/json', json.dumps({'error': '上传文件过大'}, ensure_ascii=False).encode('utf-8'), {}); return
+            self.dispatch(self.rfile.read(length))
+        def dispatch(self, body):
+            self.reply(*service.handle(self.command, self.path.split('?')[0], body))
+        def reply(self, status, content_type, payload, headers):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type); self.send_header('Content-Length', str(len(payload)))
+            for key, value in headers.items(): self.send_header(key, value)
+            self.end_headers(); self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), FormatRequestHandler)
+    server.daemon_threads = True
+    print(f"格式化服务已启动: http://{host}:{port}  (工作进程 {service.workers}，最大并发 {service.capacity})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close(); service.shutdown()
+
+def positive_int(value):
+    import argparse
+    try: number = int(value)
+    except ValueError: number = 0
+    if number < 1: raise argparse.ArgumentTypeError(f"必须是正整数: {value}")
+    return number
+
+def build_arg_parser():
+    import argparse
+    parser = argparse.ArgumentParser(prog='format_document.py', description='公文智能排版工具（不带参数运行时启动图形界面）')
+    subparsers = parser.add_subparsers(dest='command')
+    batch = subparsers.add_parser('batch', help='批量格式化目录或通配符匹配的文件')
+    batch.add_argument('inputs', nargs='+', help='源文件目录或通配符，例如 drafts/ 或 "drafts/**/*.docx"')
+    batch.add_argument('--meta', help='公文要素 JSON 文件（键与界面字段一致）')
+    batch.add_argument('--jobs', type=positive_int, default=None, help='并行进程数（默认为 CPU 核数）')
+    batch.add_argument('--report', default=BATCH_REPORT_FILE, help=f'汇总报告输出路径（默认 {BATCH_REPORT_FILE}）')
+    batch.add_argument('--profile', action='store_true', help='在报告中记录逐段落/逐表格的累计耗时')
+    batch.add_argument('--styles', action='store_true', help='使用命名样式代替逐段直接格式（输出更小、更快）')
+    batch.add_argument('--stream', action='store_true', help='流式写出正文（超长文档内存占用基本恒定，输出与默认引擎一致）')
+    batch.add_argument('--cache-dir', help='输出缓存目录：源文件与要素未变化时直接复用上次结果')
+    batch.add_argument('--cache-max-mb', type=int, default=OUTPUT_CACHE_MAX_BYTES // 2 ** 20, help=f'输出缓存目录容量上限（MB，默认 {OUTPUT_CACHE_MAX_BYTES // 2 ** 20}）')
+    merge = subparsers.add_parser('merge', help='套打：正文只排版一次，按数据表逐行生成多份公文')
+    merge.add_argument('source', help='正文源文件（.txt 或 .docx）')
+    merge.add_argument('rows', help='套打数据表：CSV（首行为字段名）或 JSON 对象数组，字段名与界面一致，如 copy_number、main_recipient、doc_number、cc_list')
+    merge.add_argument('--meta', help='各份共用的公文要素 JSON 文件；数据表中的空单元格沿用此处的值')
+    merge.add_argument('--out-dir', help='输出目录（默认与源文件相同）')
+    merge.add_argument('--name-field', help='把该字段的值加入输出文件名，例如 main_recipient')
+    merge.add_argument('--jobs', type=positive_int, default=1, help='并行进程数（默认 1，在当前进程内依次生成）')
+    merge.add_argument('--report', default=MERGE_REPORT_FILE, help=f'汇总报告输出路径（默认 {MERGE_REPORT_FILE}）')
+    merge.add_argument('--styles', action='store_true', help='使用命名样式代替逐段直接格式（输出更小、更快）')
+    serve = subparsers.add_parser('serve', help='以本地 HTTP 服务方式提供格式化')
+    serve.add_argument('--host', default=SERVE_HOST, help=f'监听地址（默认 {SERVE_HOST}）')
+    serve.add_argument('--port', type=int, default=SERVE_PORT, help=f'监听端口（默认 {SERVE_PORT}）')
+    serve.add_argument('--workers', type=positive_int, default=None, help='常驻工作进程数（默认为 CPU 核数）')
+    serve.add_argument('--queue', type=int, default=None, help='排队请求上限，超出时返回 503（默认为工作进程数的 2 倍）')
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        from format_gui import App
+        App().mainloop()
+        return 0
+    args = build_arg_parser().parse_args(argv)
+    if args.command == 'batch':
+        input_paths, unmatched = collect_inputs(args.inputs)
+        for pattern in unmatched: print(f"[警告] 未匹配到任何文件: {pattern}", file=sys.stderr)
+        if not input_paths:
+            print("未找到可处理的 .txt 或 .docx 文件。", file=sys.stderr); return 2
+        data = load_metadata(args.meta)
+        if args.styles: data['use_styles'] = True
+        if args.stream: data['streaming'] = True
+        output_cache = OutputCache(args.cache_dir, args.cache_max_mb * 2 ** 20) if args.cache_dir else None
+        summary = run_batch(input_paths, data, jobs=args.jobs, report_path=args.report, profile=args.profile, output_cache=output_cache, unmatched=unmatched)
+        print(f"共 {summary['total']} 个文件，成功 {summary['succeeded']}（缓存命中 {summary['cache_hits']}），失败 {summary['failed']}，耗时 {summary['seconds']}s")
+        if args.report: print(f"汇总报告: {args.report}")
+        return 0 if summary['failed'] == 0 else 1
+    if args.command == 'merge':
+        try:
+            rows = load_merge_rows(args.rows); data = load_metadata(args.meta)
+        except (OSError, ValueError) as e:
+            print(f"无法读取套打数据: {type(e).__name__}: {e}", file=sys.stderr); return 2
+        if not rows:
+            print(f"套打数据表为空: {args.rows}", file=sys.stderr); return 2
+        if args.styles: data['use_styles'] = True
+        try:
+            summary = run_merge(args.source, rows, data, jobs=args.jobs, out_dir=args.out_dir, name_field=args.name_field, report_path=args.report)
+        except InvalidSourceError as e:
+            print(e, file=sys.stderr); return 2
+        print(f"共 {summary['total']} 份，成功 {summary['succeeded']}，失败 {summary['failed']}，正文排版 {summary['body_seconds']}s，总耗时 {summary['seconds']}s")
+        if args.report: print(f"汇总报告: {args.report}")
+        return 0 if summary['failed'] == 0 else 1
+    if args.command == 'serve':
+        run_server(args.host, args.port, args.workers, args.queue)
+    return 0
 
 if __name__ == "__main__":
-    app = App()
-    app.mainloop()
\ No newline at end of file
+    sys.exit(main())
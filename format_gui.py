@@ -0,0 +1,365 @@
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox, Toplevel, Listbox, END, Menu
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import sv_ttk
+from format_document import GovDocFormatter, FormatCancelled, OutputCache
+
+# --- 全局配置 ---
+CONFIG_FILE = 'gov_doc_format_config.json'
+HISTORY_DB = 'gov_doc_format_history.db'
+HISTORY_SCHEMA_VERSION = 1
+HISTORY_FLUSH_DELAY_MS = 500
+SUGGESTION_LIMIT = 50
+POLL_INTERVAL_MS = 100
+
+# --- GUI and App Logic ---
+class HistoryStore:
+    # 常用项历史：SQLite 存储，按 (字段, 值) 建立索引；写入先留在事务中，由界面防抖后统一提交
+    def __init__(self, filename=HISTORY_DB, legacy_config=CONFIG_FILE):
+        self.warning = None
+        try:
+            self.conn = self.connect(filename)
+        except sqlite3.Error as e:
+            # 工作目录不可写时仍能启动，常用项只保存在本次运行的内存中
+            self.warning = f"无法打开常用项数据库 {filename}（{e}），本次修改的常用项不会被保存。"
+            print(f"[警告] {self.warning}", file=sys.stderr)
+            self.conn = self.connect(':memory:')
+        self.on_dirty = None
+        self.migrate_legacy(legacy_config)
+
+    def connect(self, filename):
+        conn = sqlite3.connect(filename)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history (field TEXT NOT NULL, value TEXT NOT NULL, uses INTEGER NOT NULL DEFAULT 1,"
+                " last_used REAL NOT NULL, PRIMARY KEY (field, value)) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_mru ON history (field, last_used DESC)")
+            conn.commit()
+        except sqlite3.Error:
+            conn.close(); raise
+        return conn
+
+    def migrate_legacy(self, legacy_config):
+        # 首次运行时导入旧版 JSON 配置，保留原有顺序（越靠后越新）；
+        # 是否已导入记在 user_version 中，用户删光常用项后不会被再次导入
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= HISTORY_SCHEMA_VERSION: return
+        rows = []
+        # 旧版本创建的数据库没有记录版本，有数据即说明已经导入过
+        if legacy_config and os.path.exists(legacy_config) and not self.conn.execute("SELECT 1 FROM history LIMIT 1").fetchone():
+            try:
+                with open(legacy_config, 'r', encoding='utf-8') as f: data = json.load(f)
+            except (OSError, json.JSONDecodeError): data = {}
+            now = time.time()
+            rows = [(field, value, 1, now - len(values) + i) for field, values in data.items() if isinstance(values, list)
+                    for i, value in enumerate(values) if isinstance(value, str) and value]
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO history (field, value, uses, last_used) VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+
+    def values(self, field, prefix='', limit=SUGGESTION_LIMIT):
+        sql, params = "SELECT value FROM history WHERE field = ?", [field]
+        if prefix:
+            # 前缀查询走主键 (field, value) 的范围扫描
+            sql += " AND value >= ? AND value < ?"; params += [prefix, prefix + '\U0010ffff']
+        sql += " ORDER BY last_used DESC, uses DESC"
+        if limit: sql += " LIMIT ?"; params.append(limit)
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def contains(self, field, value):
+        return self.conn.execute("SELECT 1 FROM history WHERE field = ? AND value = ?", (field, value)).fetchone() is not None
+
+    def touch(self, field, value):
+        if not value: return
+        self.conn.execute(
+            "INSERT INTO history (field, value, uses, last_used) VALUES (?, ?, 1, ?)"
+            " ON CONFLICT (field, value) DO UPDATE SET uses = uses + 1, last_used = excluded.last_used", (field, value, time.time()))
+        self.mark_dirty()
+
+    def delete(self, field, values):
+        self.conn.executemany("DELETE FROM history WHERE field = ? AND value = ?", [(field, value) for value in values])
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        if self.on_dirty: self.on_dirty()
+        else: self.flush()
+
+    def flush(self):
+        if self.conn.in_transaction: self.conn.commit()
+
+    def close(self):
+        self.flush(); self.conn.close()
+
+class ManagementDialog(Toplevel):
+    def __init__(self, parent, title, key, history, on_close_callback):
+        super().__init__(parent)
+        self.title(f"管理 {title}"); self.key = key; self.history = history
+        self.on_close_callback = on_close_callback
+        self.protocol("WM_DELETE_WINDOW", self.close_dialog)
+        self.transient(parent); self.grab_set()
+
+        self.listbox = Listbox(self, width=50, height=10, font=("Segoe UI", 10)); self.listbox.pack(padx=15, pady=15, fill=tk.BOTH, expand=True)
+        self.listbox.insert(END, *self.history.values(self.key, limit=None))
+        
+        btn_frame = ttk.Frame(self); btn_frame.pack(fill=tk.X, padx=15, pady=(0, 15))
+        del_btn = ttk.Button(btn_frame, text="删除选中", command=self.delete_item); del_btn.pack(side=tk.RIGHT)
+
+    def delete_item(self):
+        selected_indices = self.listbox.curselection()
+        if not selected_indices: return
+        items = [self.listbox.get(i) for i in selected_indices]
+        for i in reversed(selected_indices):
+            self.listbox.delete(i)
+        self.history.delete(self.key, items)
+
+    def close_dialog(self):
+        self.on_close_callback()
+        self.destroy()
+
+class ManagedField(ttk.Frame):
+    def __init__(self, parent, key, label, history, controls_dict):
+        super().__init__(parent)
+        self.key = key
+        self.history = history
+        self.controls_dict = controls_dict
+
+        self.pack(fill=tk.X, pady=10, anchor='n')
+        ttk.Label(self, text=label, font=("Segoe UI", 10, "bold")).pack(anchor=tk.W, pady=(0, 5))
+        
+        input_frame = ttk.Frame(self)
+        input_frame.pack(fill=tk.X)
+
+        self.combo = ttk.Combobox(input_frame, font=("Segoe UI", 10))
+        self.combo.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.controls_dict[key] = self.combo
+        self.combo.bind('<KeyRelease>', self.filter_values)
+        self.refresh_values()
+
+        add_button = ttk.Button(input_frame, text="+ ", width=3, command=self.add_item)
+        add_button.pack(side=tk.LEFT, padx=(5, 5))
+
+        manage_button = ttk.Button(input_frame, text="⚙️", width=3, command=self.open_management_dialog)
+        manage_button.pack(side=tk.LEFT)
+
+    def add_item(self):
+        new_item = self.combo.get()
+        if not new_item: return
+        self.history.touch(self.key, new_item)
+        self.refresh_values()
+        self.combo.set(new_item)
+
+    def open_management_dialog(self):
+        ManagementDialog(self, self.key, self.key, self.history, self.refresh_values)
+
+    def refresh_values(self):
+        self.combo['values'] = self.history.values(self.key)
+
+    def filter_values(self, event=None):
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'): return
+        self.combo['values'] = self.history.values(self.key, prefix=self.combo.get().strip())
+
+class App(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title("公文智能排版工具"); self.geometry("800x850")
+        self.history = HistoryStore()
+        self.history.on_dirty = self.schedule_history_flush; self.history_flush_id = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.formatter = None; self.formatter_lock = threading.Lock()
+        self.worker = None; self.cancel_event = threading.Event(); self.events = queue.Queue()
+        sv_ttk.set_theme("dark")
+        self.create_widgets()
+        if self.history.warning: self.after_idle(lambda: messagebox.showwarning("常用项", self.history.warning))
+        # 窗口显示后在后台预热格式化引擎（加载 python-docx），不阻塞首屏
+        self.after_idle(lambda: threading.Thread(target=self.get_formatter, daemon=True).start())
+
+    def get_formatter(self):
+        with self.formatter_lock:
+            if self.formatter is None: self.formatter = GovDocFormatter(output_cache=OutputCache())
+            return self.formatter
+
+    def create_widgets(self):
+        main_frame = ttk.Frame(self, padding=25); main_frame.pack(fill=tk.BOTH, expand=True)
+        self.controls = {}
+
+        file_card = ttk.LabelFrame(main_frame, text=" 源文件 ", padding=20)
+        file_card.pack(fill=tk.X, pady=(0, 15))
+        self.file_path_var = tk.StringVar(value="尚未选择文件...")
+        select_button = ttk.Button(file_card, text="选择 .txt 或 .docx 文件", command=self.select_file)
+        select_button.pack(side=tk.LEFT, padx=(0, 15))
+        ttk.Label(file_card, textvariable=self.file_path_var).pack(side=tk.LEFT)
+
+        notebook = ttk.Notebook(main_frame); notebook.pack(fill=tk.BOTH, expand=True, pady=10)
+        tab1 = ttk.Frame(notebook, padding=20); tab2 = ttk.Frame(notebook, padding=20); tab3 = ttk.Frame(notebook, padding=20)
+        notebook.add(tab1, text='版头要素'); notebook.add(tab2, text='主体与文末'); notebook.add(tab3, text='版记与选项')
+
+        # 选项变量先行创建，尚未打开的选项卡也能提供默认值
+        self.controls['title_option'] = tk.StringVar(value="auto")
+        self.controls['add_red_separator'] = tk.BooleanVar(value=False)
+        self.controls['is_stamped'] = tk.BooleanVar(value=True)
+        self.controls['add_page_number'] = tk.BooleanVar(value=True)
+        self.controls['use_styles'] = tk.BooleanVar(value=False)
+
+        # --- Tabs Content ---
+        # 只构建首个可见选项卡，其余选项卡在第一次切换到时再构建
+        self.create_header_tab(tab1)
+        self.pending_tabs = {str(tab2): self.create_body_tab, str(tab3): self.create_record_tab}
+        notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+
+        self.generate_button = ttk.Button(main_frame, text="生成格式化Word文档", command=self.generate_document, style='Accent.TButton')
+        self.generate_button.pack(fill=tk.X, ipady=8, pady=(15, 5))
+
+        progress_frame = ttk.Frame(main_frame); progress_frame.pack(fill=tk.X)
+        self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate', maximum=100)
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.cancel_button = ttk.Button(progress_frame, text="取消", width=6, command=self.cancel_generation, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(10, 0))
+        self.progress_var = tk.StringVar(value="")
+        ttk.Label(main_frame, textvariable=self.progress_var).pack(anchor=tk.W, pady=(5, 0))
+
+    def create_header_tab(self, tab):
+        ManagedField(tab, "copy_number", "份号", self.history, self.controls)
+        ManagedField(tab, "security_level", "密级和保密期限", self.history, self.controls)
+        ManagedField(tab, "urgency", "紧急程度", self.history, self.controls)
+        ManagedField(tab, "issuing_authority_logo", "发文机关标志", self.history, self.controls)
+        ManagedField(tab, "doc_number", "发文字号", self.history, self.controls)
+        ManagedField(tab, "signatory", "签发人", self.history, self.controls)
+
+    def create_body_tab(self, tab):
+        self.create_title_options(tab)
+        ManagedField(tab, "main_recipient", "主送机关", self.history, self.controls)
+        ManagedField(tab, "issuing_authority_signature", "发文机关署名", self.history, self.controls)
+        ManagedField(tab, "doc_date", "成文日期", self.history, self.controls)
+        ManagedField(tab, "attachment_note", "附件说明", self.history, self.controls)
+        ManagedField(tab, "addendum", "附注", self.history, self.controls)
+
+    def create_record_tab(self, tab):
+        ManagedField(tab, "cc_list", "抄送机关", self.history, self.controls)
+        ManagedField(tab, "printing_info", "印发机关和印发日期", self.history, self.controls)
+
+        options_card = ttk.LabelFrame(tab, text=" 格式选项 ", padding=20)
+        options_card.pack(fill=tk.X, pady=25)
+        ttk.Checkbutton(options_card, text="生成红色分隔线", variable=self.controls['add_red_separator']).pack(side=tk.LEFT, padx=15)
+        ttk.Checkbutton(options_card, text="是否加盖印章", variable=self.controls['is_stamped']).pack(side=tk.LEFT, padx=15)
+        ttk.Checkbutton(options_card, text="生成页码", variable=self.controls['add_page_number']).pack(side=tk.LEFT, padx=15)
+        ttk.Checkbutton(options_card, text="样式排版（文件更小）", variable=self.controls['use_styles']).pack(side=tk.LEFT, padx=15)
+
+    def on_tab_changed(self, event):
+        notebook = event.widget
+        tab_id = notebook.select()
+        builder = self.pending_tabs.pop(tab_id, None)
+        if builder: builder(notebook.nametowidget(tab_id))
+
+    def schedule_history_flush(self):
+        # 防抖：连续操作只在停顿 HISTORY_FLUSH_DELAY_MS 后提交一次
+        if self.history_flush_id is not None: self.after_cancel(self.history_flush_id)
+        self.history_flush_id = self.after(HISTORY_FLUSH_DELAY_MS, self.flush_history)
+
+    def flush_history(self):
+        self.history_flush_id = None
+        self.history.flush()
+
+    def on_close(self):
+        self.cancel_event.set()
+        self.history.close()
+        self.destroy()
+
+    def create_title_options(self, parent):
+        container = ttk.LabelFrame(parent, text=" 公文标题 ", padding=20)
+        container.pack(fill=tk.X, pady=10)
+
+        auto_rb = ttk.Radiobutton(container, text="自动获取 (源文件第一行)", variable=self.controls['title_option'], value="auto", command=self.toggle_manual_title)
+        auto_rb.pack(anchor=tk.W)
+        
+        manual_frame = ttk.Frame(container)
+        manual_frame.pack(fill=tk.X, anchor=tk.W, pady=(5,0))
+        manual_rb = ttk.Radiobutton(manual_frame, text="手动指定", variable=self.controls['title_option'], value="manual", command=self.toggle_manual_title)
+        manual_rb.pack(side=tk.LEFT, anchor=tk.W)
+        
+        self.controls['main_title_manual'] = ttk.Entry(manual_frame, state=tk.DISABLED, font=("Segoe UI", 10))
+        self.controls['main_title_manual'].pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
+
+    def toggle_manual_title(self):
+        state = tk.NORMAL if self.controls['title_option'].get() == 'manual' else tk.DISABLED
+        self.controls['main_title_manual'].config(state=state)
+
+    def select_file(self):
+        path = filedialog.askopenfilename(filetypes=[("All supported", "*.txt *.docx"), ("Text", "*.txt"), ("Word", "*.docx")])
+        if path: self.file_path_var.set(path)
+
+    def generate_document(self):
+        if self.worker is not None: return
+        input_path = self.file_path_var.get()
+        if "尚未选择" in input_path: messagebox.showwarning("警告", "请先选择一个文件！"); return
+        gui_data = {key: (var.get() if hasattr(var, 'get') else var) for key, var in self.controls.items()}
+        for key, control in self.controls.items():
+            # 已保存的常用项在使用时更新 MRU/使用次数，新输入的内容不会自动保存
+            if isinstance(control, ttk.Combobox) and self.history.contains(key, gui_data[key]): self.history.touch(key, gui_data[key])
+        self.cancel_event.clear()
+        self.set_generating(True)
+        self.worker = threading.Thread(target=self.run_generation, args=(gui_data, input_path), daemon=True)
+        self.worker.start()
+        self.after(POLL_INTERVAL_MS, self.poll_generation)
+
+    def run_generation(self, gui_data, input_path):
+        # 工作线程：不直接操作界面，只把进度和结果放入队列，由主线程 after() 轮询
+        try:
+            output_path = self.get_formatter().process(gui_data, input_path, progress=self.report_progress, cancel_event=self.cancel_event)
+            self.events.put(('done', output_path))
+        except FormatCancelled:
+            self.events.put(('cancelled', None))
+        except Exception as e:
+            self.events.put(('error', e))
+
+    def report_progress(self, paragraphs, tables, total):
+        self.events.put(('progress', (paragraphs, tables, total)))
+
+    def poll_generation(self):
+        while True:
+            try: kind, payload = self.events.get_nowait()
+            except queue.Empty: break
+            if kind == 'progress': self.show_progress(*payload); continue
+            self.worker = None
+            self.set_generating(False)
+            if kind == 'done':
+                self.progress_bar['value'] = 100; self.progress_var.set("生成完成")
+                messagebox.showinfo("成功", f"文件已成功生成！\n保存路径: {payload}")
+            elif kind == 'cancelled':
+                self.progress_bar['value'] = 0; self.progress_var.set("已取消")
+            else:
+                self.progress_var.set("生成失败")
+                messagebox.showerror("生成失败", f"发生严重错误：\n{payload}\n\n请检查文件内容或联系技术支持。")
+            return
+        self.after(POLL_INTERVAL_MS, self.poll_generation)
+
+    def show_progress(self, paragraphs, tables, total):
+        if total:
+            if str(self.progress_bar['mode']) != 'determinate': self.progress_bar.stop(); self.progress_bar.config(mode='determinate')
+            self.progress_bar['value'] = min(100, (paragraphs + tables) * 100 / total)
+        self.progress_var.set(f"正在生成：已处理段落 {paragraphs}，表格 {tables}")
+
+    def set_generating(self, generating):
+        self.generate_button.config(state=tk.DISABLED if generating else tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL if generating else tk.DISABLED)
+        if generating:
+            # .txt 源文件无法预知段落总数，使用不定进度条
+            self.progress_bar.config(mode='indeterminate'); self.progress_bar['value'] = 0; self.progress_bar.start(15)
+            self.progress_var.set("正在生成…")
+        else:
+            self.progress_bar.stop(); self.progress_bar.config(mode='determinate')
+
+    def cancel_generation(self):
+        if self.worker is None: return
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress_var.set("正在取消…")
+
+if __name__ == "__main__":
+    app = App()
+    app.mainloop()